@@ -26,16 +26,29 @@
 # In[1]:
 
 
-pip install selenium
+pip install selenium httpx[http2]
 
 
 # In[2]:
 
 
+import atexit
+import csv
+import functools
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+import httpx
 import numpy as np
 import pandas as pd
 import selenium
 from selenium import webdriver
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
@@ -51,7 +64,9 @@ from selenium.webdriver.common.by import By
 
 # Let's start by importing our dataset.
 
-df = pd.read_csv('demo_stock_data.csv', index_col=0) # Helps to save the CSV file to the same directory where the notebook file is located. If not, include the filepath in the code
+# dtype tells pandas what kind of data each column holds up front, so it doesn't have to guess while reading the file
+# "string" is for text, and "category" is for a column that only has a few distinct values (like ETF vs. Fund)
+df = pd.read_csv('demo_stock_data.csv', index_col=0, dtype={"Ticker": "string", "Type": "category"}, engine="c") # Helps to save the CSV file to the same directory where the notebook file is located. If not, include the filepath in the code
 df
 
 
@@ -91,28 +106,74 @@ bball_data
 # 
 # As mentioned earlier, Selenium will mimic user actions on a Chrome web page: clicking, opening new URLs, etc.
 # 
-# To get started with Selenium, we will first need to find the file path to the ChromeDriver we downloaded earlier. This will open a separate Chrome window where Selenium will run.
+# To get started with Selenium, we will first need to find the file path to the ChromeDriver we downloaded earlier. ChromeDriver is a little program that sits between Python and Chrome, and every Chrome window Selenium opens goes through it.
+# 
+# Scraping one ticker at a time means waiting for one page load after another. Since every ticker is independent, we'll scrape several at once using a few threads. A single Chrome window can only be on one page at a time, though, so every thread gets its own driver. ```threading.local()``` gives each thread its own private copy of a variable, and we only open the window the first time a thread needs it. Starting ChromeDriver itself takes a second or two, though, and there's no reason to do it once per thread. So we start it once as a ```Service``` and have every thread open its Chrome window through that same ChromeDriver.
+# 
+# We also don't need most of what a normal Chrome window does. All we want is two numbers, so there's no point in drawing the window, downloading images and fonts, or loading ads and trackers. ```ChromeOptions``` lets us run Chrome *headless* (without a window) and turn images off, and ```Network.setBlockedURLs``` tells Chrome to skip any request that matches one of our patterns.
 
 # In[6]:
 
 
 PATH = "/Users/arnavgurudatt/chromedriver" # Change this file path to match the chromedriver location on your device!
-driver = webdriver.Chrome(PATH)
 
+HEADLESS = True # Set this to False if you want to watch the scraper work
 
-# As you may have noticed, the Chrome WebDriver would have opened an entirely new Chrome window! That's where the action happens. You can actually see what goes on in that window as your web scraper runs. It's usually a good idea to monitor it to check for errors or stoppages.
-# 
-# Now comes the magic – let's write a function that can scrape the Monthly and YTD values from morningstar.
+CHROME_ARGUMENTS = ["--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage", "--disable-extensions",
+                    "--blink-settings=imagesEnabled=false"] # Don't download images
+# * matches anything, so "*.png" is every PNG image. Morningstar's own JavaScript isn't on this list, since that's
+# what draws the Trailing Returns table; everything else here is pictures, fonts, video, ads and trackers
+BLOCKED_URLS = ["*.png", "*.jpg", "*.gif", "*.mp4", "*.woff*", "*.css", # Images, video, fonts and styling
+                "*doubleclick*", "*google-analytics*", "*googletagmanager*", "*facebook*", "*tealium*"] # Ads and trackers
+
+# Start ChromeDriver once. Every driver below connects to it instead of launching its own
+service = Service(PATH)
+service.start()
+atexit.register(service.stop)
+
+thread_data = threading.local() # Each thread sees its own copy of whatever we store on thread_data
+drivers = [] # Every driver we've opened, so we can close them all once a run is done
 
-# In[7]:
 
+def close_drivers():
+    # The worker threads go away after every run, but their Chrome windows don't, so we quit them ourselves
+    while drivers:
+        drivers.pop().quit()
 
-# Let's start by creating a couple of lists to store our data. We'll add these to the dataframe later.
 
-one_mo_vals = [] # List for Monthly returns
-ytd_vals = [] # List for YTD returns
+atexit.register(close_drivers) # And in case Python exits in the middle of a run
 
 
+def execute_cdp_cmd(driver, cmd, params):
+    # This talks to Chrome directly through the Chrome DevTools Protocol (CDP)
+    return driver.execute("executeCdpCommand", {"cmd": cmd, "params": params})["value"]
+
+
+def get_driver():
+    if not hasattr(thread_data, "driver"):
+        options = webdriver.ChromeOptions()
+        for argument in CHROME_ARGUMENTS:
+            options.add_argument(argument)
+        if HEADLESS:
+            options.add_argument("--headless=new")
+        # webdriver.Chrome() would start (and later stop) a ChromeDriver of its own, so we use webdriver.Remote()
+        # pointed at the shared service instead. ChromiumRemoteConnection adds Chrome's extra commands, like CDP
+        # keep_alive=True (it's on by default, we just spell it out) reuses one connection to ChromeDriver for every
+        # command instead of opening a new one each time
+        connection = ChromiumRemoteConnection(remote_server_addr=service.service_url, vendor_prefix="goog", browser_name="chrome",
+                                              keep_alive=True)
+        thread_data.driver = webdriver.Remote(command_executor=connection, options=options)
+        drivers.append(thread_data.driver)
+
+        execute_cdp_cmd(thread_data.driver, "Network.enable", {})
+        execute_cdp_cmd(thread_data.driver, "Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    return thread_data.driver
+
+
+# Once the scraper starts, every thread that needs one gets its own Chrome. If you set ```HEADLESS = False```, you'll see a new Chrome window open for each of them. That's where the action happens. You can actually see what goes on in those windows as your web scraper runs. It's usually a good idea to monitor them to check for errors or stoppages. Headless Chrome isn't always faster on every site, so if scraping feels slower with it, try turning it off – the image and URL blocking still help either way.
+# 
+# Now comes the magic – let's write a function that can scrape the Monthly and YTD values from morningstar.
+
 # One thing that's very important in web scraping is URL manipulation. We're trying to scrape data for multiple index funds across several different web pages. This seems like a complicated task if we can't scrape everything all at once from the same web page.
 # 
 # However, let's take a look at Morningstar's URL patterns for various equities:
@@ -125,12 +186,13 @@ ytd_vals = [] # List for YTD returns
 # 
 # We can exploit this fact for some simple URL string manipulation.
 
-# In[8]:
+# In[7]:
 
 
 # Let's get the names of all the ticker symbols from our data frame
+# Morningstar's URLs use lowercase tickers, so we lowercase them all here once
 
-df_tickers = df[["Ticker"]].Ticker.values.tolist()
+df_tickers = df["Ticker"].str.lower().tolist()
 df_tickers
 
 
@@ -138,116 +200,289 @@ df_tickers
 # 
 # Also, there's a lot of comments here, but don't be scared, they're there to help you. Read them so you have an idea of what's going on. The actual code is pretty simple and doesn't take up too many lines, but if you want to understand what each line means, the comments cover the syntax. Or, maybe you just want to rip the code for your own project and just replace the names with whatever you need. That's fine, too.
 
+# Clicking through the website works, but it's slow: for every ticker Chrome has to render the whole page, run all of its JavaScript and download every ad and tracker on it, just so we can read two numbers.
+# 
+# Here's a trick worth knowing. Open the Network tab in inspect element and reload the performance page – you'll see the Trailing Returns table isn't part of the HTML at all. The page fetches it as JSON from Morningstar's API (```api-global.morningstar.com/sal-service/...```) and then draws it. If we ask that API ourselves with ```httpx```, we get the same numbers without opening a browser. We'll keep the Selenium version around as a backup in case the API call doesn't work out for a ticker.
+# 
+# ```httpx``` works a lot like the popular ```requests``` library, but it can also speak HTTP/2. With HTTP/1.1 every request needs a connection to itself while it's running (and browsers cap that at about 6 per website). HTTP/2 can send many requests over one connection at the same time, so all of our threads can share a single ```httpx.Client```.
+
+# In[8]:
+
+
+MORNINGSTAR_API_KEY = "" # If the API turns you away, copy the "apikey" request header from the Network tab into here
+
+# The client keeps its connection to Morningstar open between requests, so we don't redo the handshake for every ticker
+# Unlike a Chrome window, an httpx.Client is safe to share between threads
+client = httpx.Client(
+    http2=True,
+    headers={"User-Agent": "Mozilla/5.0", **({"apikey": MORNINGSTAR_API_KEY} if MORNINGSTAR_API_KEY else {})},
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+    timeout=10,
+)
+atexit.register(client.close)
+
+SEARCH_URL = "https://www.morningstar.com/api/v2/search/securities"
+PERFORMANCE_URL = "https://api-global.morningstar.com/sal-service/v1/{kind}/performance/v3/{secid}"
+
+
+def lookup_security(ticker_name):
+    # The search API is the same thing the search page uses. It tells us the security ID Morningstar uses internally
+    # and whether the ticker is an ETF or a FUND
+    response = client.get(SEARCH_URL, params={"q": ticker_name})
+    response.raise_for_status()
+    for result in response.json()["results"]:
+        if str(result["ticker"]).lower() == ticker_name:
+            kind = "etf" if "etf" in str(result["securityType"]).lower() else "fund"
+            return result["securityID"], kind
+    raise KeyError(ticker_name)
+
+
+def api_scraper(ticker_name):
+    secid, kind = lookup_security(ticker_name)
+    url = PERFORMANCE_URL.format(kind=kind, secid=secid)
+    response = client.get(url, params={"frequency": "monthly"})
+    response.raise_for_status()
+
+    # The first row of trailingReturns is the Total Return % (Price) row we'd otherwise read off the page
+    row = response.json()["trailingReturns"][0]
+    return "{:.2f}".format(row["oneMonth"]), "{:.2f}".format(row["ytd"])
+
+
+# Now for the Selenium version. This is the backup we'll fall back on if the API doesn't give us an answer.
+# 
+# Remember the URL patterns from earlier? Instead of searching for each ticker and clicking through to its page, we can just build the PERFORMANCE page URL ourselves – one page load per ticker instead of two. The only other thing we need to know is whether a ticker is an ETF (```etfs/arcx```) or a FUND (```funds/xnas```), and our data set already tells us that in its ```Type``` column. We put that into ```ticker_exchanges``` up front, so we go straight to the right page. If a ticker's type is missing, we try one pattern and then the other, and remember whichever one works.
+
 # In[9]:
 
 
-def scraper(ticker_name): # Our function, called scraper, takes the name of the ticker as its parameter
-    
-    # Morningstar uses a search query where you can find the information on any ticker at the top. This is our URL.
-    url = "https://www.morningstar.com/search/us-securities?query=" + str(ticker_name).lower()
-    driver.get(url) # Call get() on the URL so that the Chrome WebDriver visits the website
-
-    # WTF is this scary witch spell string???
-    # It's called an XPATH, and each element in HTML has a unique one. Make use of inspect element to find it.
-    # Believe it or not, it's one of the easiest ways to scrape information. Think of it like a file path on
-    # your computer (e.g. Desktop/SAAS/RP/rp_project.py) except the file directs to an HTML element on a web page
-    link = driver.find_element(By.XPATH, '//*[@id="__layout"]/div/div/div[2]/div[3]/main/div/div/div[1]/section/div[1]/a')
-    # We generate the URL we want to click and store it in link. link.click() mimics a user clicking the link
-    link.click()
+# ?frequency=monthly asks for the Month End numbers straight away, the same setting the API call above uses
+PAGE_URL = "https://www.morningstar.com/{kind}/{exchange}/{ticker}/performance?frequency=monthly"
+EXCHANGES = {"ETF": ("etfs", "arcx"), "Fund": ("funds", "xnas")} # The URL patterns for ETFs and FUNDS
+
+# ticker -> its (kind, exchange), straight from the Type column of our df
+ticker_exchanges = {
+    ticker: EXCHANGES[asset_type]
+    for ticker, asset_type in zip(df_tickers, df["Type"])
+    if asset_type in EXCHANGES
+}
+
+# WTF are these scary witch spell strings???
+# They're called CSS selectors, and they're one of the easiest ways to point at an HTML element on a web page.
+# If you right-click an element in inspect element, you can also copy its XPATH, which is like a file path on
+# your computer (e.g. Desktop/SAAS/RP/rp_project.py) that walks down from the top of the page, one div at a time:
+# /html/body/div[2]/div/div/div/div[2]/div[3]/.../table/tbody/tr[1]/td[2]
+# Those work, but they're long and they break as soon as Morningstar moves anything above the table around.
+# Instead, we start from something on the page that won't move – the sal-components-funds-performance element that
+# holds the Trailing Returns widget on both ETF and FUND pages – and only describe the way from there:
+# "the first row of the table in its second section, 2nd column" for Monthly, and the 5th column for YTD
+# We write them down once up here instead of retyping them every time the function runs
+SELECTOR_MONTHLY_BUTTON = "#monthly" # # means "the element with this id"
+# nth-of-type(2) means "the 2nd td", just like td[2] in an XPATH. (nth-child(2) would count every kind of element,
+# so a <th> row label at the start of the row would throw the count off by one)
+SELECTOR_RESULTS_ROW = "sal-components-funds-performance section:nth-of-type(2) table tbody tr:first-of-type"
+SELECTOR_ONE_MO = SELECTOR_RESULTS_ROW + " td:nth-of-type(2)"
+SELECTOR_YTD = SELECTOR_RESULTS_ROW + " td:nth-of-type(5)"
+
+# Every find_element() is another round trip between Python and Chrome. Instead, we can send Chrome a tiny bit of
+# JavaScript that looks up all the selectors we give it (querySelector) and sends back just their text, all at once
+READ_VALUES_JS = """
+const text = selector => document.querySelector(selector)?.textContent?.trim();
+return Array.from(arguments, text);
+"""
+
+
+def read_values(driver, *selectors):
+    values = driver.execute_script(READ_VALUES_JS, *selectors) # The selectors show up as arguments in the JavaScript
+    return values if all(values) else None # None means "not loaded yet"
+
+
+def is_active(toggle):
+    # Selenium's is_selected() only works for checkboxes, radio buttons and dropdown options, not buttons, so we
+    # check the ways a web page usually marks the chosen button instead
+    if "true" in (toggle.get_attribute("aria-pressed"), toggle.get_attribute("aria-selected")):
+        return True
+    classes = (toggle.get_attribute("class") or "").split()
+    return any(name == "active" or name.endswith(("-active", "--active", "-selected", "--selected")) for name in classes)
+
+
+def has_changed(cell, old_text):
+    # True once the page has replaced the cell with a new one, or put different text in it
+    try:
+        return cell.text != old_text
+    except StaleElementReferenceException: # The old cell isn't on the page anymore
+        return True
+
+
+def selenium_scraper(ticker_name): # Our function, called selenium_scraper, takes the name of the ticker as its parameter
+    driver = get_driver() # The Chrome window that belongs to this thread
     
     # If you don't have stable connection or selenium is bugging out, it will take a while to open the web page
     # This doesn't stop Python from reading the rest of the commands though – this can cause errors.
-    # The implicitly_wait() method allows the web page to take its time loading for a little before execution
-    # It's generally bad practice to use implicitly_wait(). You should use WebDriverWait
-    # There's also an explicitly_wait() method but it's much more complicated so this is a hacky solution
-    driver.implicitly_wait(5)
+    # WebDriverWait fixes this: wait.until() keeps checking for the element and hands it back the moment it's ready,
+    # and only gives up after 10 seconds. EC (expected_conditions) says what we're waiting for, e.g. clickable
+    # This is much better than implicitly_wait(), which always makes you wait around even if the page loaded instantly
+    wait = WebDriverWait(driver, 10)
     
-    
-    # There's still one problem we haven't handled yet: is the equity an ETF or a FUND?
-    # It's easier to do this using driver.current_url and string manipulation, but it's not working for me ;-;
-    # e.g. https://www.morningstar.com/etfs/arcx/spy/quote
-    # current_url = driver.current_url # driver has a current_url attribute to retrieve this info
-    # print(current_url)
-    # is_etf = "etfs" in current_url # is_etf will be True if the current_url has "etfs" in it, False otherwise
-    # is_fund = "funds" in current_url # is_fund will be True if the current_url has "funds" in it, False otherwise
-
-    # Since that's not working, we'll just use try/except
-
-    try: 
-        # We need to get to the PERFORMANCE tab. This is why knowing whether the equity is an ETF vs. FUND is important.
-        # ETFs all have the same XPATH for the PERFORMANCE tab. Let's save the XPATH.
-        # Selenium Webdriver has a "By" class that allows us to select web elements by Class Name, ID, XPATH, and more.
-        performance = driver.find_element(By.XPATH, '//*[@id="etf__tab-performance"]/a/span')
-        performance.click() # Click the tab
-        driver.implicitly_wait(5) # Wait for the page to load
-        
+    # Use the pattern we already know is right, or else try both of them
+    candidates = [ticker_exchanges[ticker_name]] if ticker_name in ticker_exchanges else list(EXCHANGES.values())
+    for kind, exchange in candidates:
+        driver.get(PAGE_URL.format(kind=kind, exchange=exchange, ticker=ticker_name)) # Call get() on the URL so that the Chrome WebDriver visits the website
+
         # By default, the Trailing Returns data is stored by Day End. But we want Month End data.
-        # Month End appears to be a button. Let's get its XPATH.
-        monthly_button = driver.find_element(By.XPATH, '//*[@id="monthly"]')
-        #monthly_button = driver.find_element_by_xpath('//*[@id="monthly"]')
-        monthly_button.click() # Click the button
-        driver.implicitly_wait(5) # Wait for page to load
-        
-        # Now the final step is to copy the XPATH of the elements we want and extract the text 
-        # Note the use of .text at the end – this gets the specific text string and not the web element itself
-        one_mo = driver.find_element(By.XPATH, '//*[@id="__layout"]/div/div/div[2]/div[3]/div/div[2]/main/div/div/div[1]/section/sal-components/div/sal-components-funds-performance/div/div[1]/div/div/div/div[2]/div[1]/section[2]/div/div/div/div/div[2]/div[1]/div/table/tbody/tr[1]/td[2]').text
-        ytd = driver.find_element(By.XPATH, '//*[@id="__layout"]/div/div/div[2]/div[3]/div/div[2]/main/div/div/div[1]/section/sal-components/div/sal-components-funds-performance/div/div[1]/div/div/div/div[2]/div[1]/section[2]/div/div/div/div/div[2]/div[1]/div/table/tbody/tr[1]/td[5]').text
-    except:
-        # If it's not an ETF, it's a FUND. Same business here as before
-        
-        performance = driver.find_element(By.XPATH,'//*[@id="performance"]/a/span')
-        performance.click()
-        driver.implicitly_wait(5)
-        
-        monthly_button = driver.find_element(By.XPATH, '//*[@id="monthly"]')
+        # Month End appears to be a button. If it never shows up, we're on the wrong kind of page
+        # (We wait for it even though the URL already asks for monthly data, so we can tell which kind of page it is)
+        try:
+            monthly_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, SELECTOR_MONTHLY_BUTTON)))
+        except TimeoutException:
+            continue # Wrong URL pattern, try the next one
+        ticker_exchanges[ticker_name] = (kind, exchange)
+        break
+    else:
+        raise TimeoutException("No Morningstar performance page found for " + ticker_name)
+
+    # If the page picked up ?frequency=monthly, Month End is already selected and we can skip the click and the
+    # re-render that comes with it. Otherwise, click the button just like a user would
+    if not is_active(monthly_button):
+        # The table might already be showing the Day End numbers. Remember that cell, so we can tell when it changes
+        old_cells = driver.find_elements(By.CSS_SELECTOR, SELECTOR_ONE_MO)
+        old_text = old_cells[0].text if old_cells else None
         monthly_button.click()
-        driver.implicitly_wait(5)
-        
-        one_mo = driver.find_element(By.XPATH, '/html/body/div[2]/div/div/div/div[2]/div[3]/div/div[2]/main/div/div/div[1]/section/sal-components/div/sal-components-funds-performance/div/div[1]/div/div/div/div[2]/div[1]/section[2]/div/div/div/div/div[2]/div[1]/div/table/tbody/tr[1]/td[2]').text
-        ytd = driver.find_element(By.XPATH, '/html/body/div[2]/div/div/div/div[2]/div[3]/div/div[2]/main/div/div/div[1]/section/sal-components/div/sal-components-funds-performance/div/div[1]/div/div/div/div[2]/div[1]/section[2]/div/div/div/div/div[2]/div[1]/div/table/tbody/tr[1]/td[5]').text
 
-    # Now, append the Monthly and YTD variables to their respective lists
-    one_mo_vals.append(one_mo)
-    ytd_vals.append(ytd)
+        # Wait for the switch to Month End to actually happen before reading anything – otherwise we could read the
+        # Day End numbers that were still on the page. Either of two signs is good enough: the old cell was replaced
+        # or changed, or the button now shows as switched on. (The Month End number can happen to equal the Day End
+        # one, and we can't be sure how Morningstar marks an active button, so we don't rely on just one of them)
+        # We look the button up again each time, in case the page swapped it out for a new one
+        wait.until(lambda driver: (old_cells and has_changed(old_cells[0], old_text))
+                   or is_active(driver.find_element(By.CSS_SELECTOR, SELECTOR_MONTHLY_BUTTON)))
+    
+    # Now the final step is to find the elements we want and extract the text
+    # wait.until() can also take a function. It keeps calling it until it gets something back that isn't None,
+    # so this reads both values in a single trip as soon as the results table has loaded
+    one_mo, ytd = wait.until(lambda driver: read_values(driver, SELECTOR_ONE_MO, SELECTOR_YTD))
+
+    return one_mo, ytd
 
 
 # In[10]:
 
 
-# Now let's iterate through the list of tickers and get the Monthly and YTD Trailing Returns for each one
-# You can actually watch the Chrome window scrape through each one!
-# This could take a couple minutes, though, since Selenium is literally mimicking user actions to do this.
-# Granted, it's still a lot faster than a human going to each page and copy-pasting!
+# lru_cache remembers what scraper() returned for each ticker. If a ticker shows up twice, or you re-run the cell
+# below after something went wrong halfway, the tickers we already have come back instantly
+# If scraper() raises an error nothing is remembered, so the failed tickers get tried again
+@functools.lru_cache(maxsize=None)
+def scraper(ticker_name):
+    # Try the API first, and only open the web page in Chrome if that fails
+    try:
+        one_mo, ytd = api_scraper(ticker_name)
+    except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError):
+        one_mo, ytd = selenium_scraper(ticker_name)
 
-for ticker in df_tickers:
-    scraper(ticker)
+    # Hand the Monthly and YTD values back instead of storing them anywhere. scraper() doesn't touch df or any
+    # shared list, so it doesn't matter which thread runs it, in what order, or how many times – the cells
+    # below decide where each ticker's values go
+    return one_mo, ytd
 
 
+# A quick note on why we use threads here. Every Selenium command (```get```, ```click```, ```find_element```) blocks: Python just sits there until Chrome answers. Running a few threads means one thread can wait on its page while the others keep working, so the waits overlap instead of adding up. You might also come across async Selenium libraries like ```aselenium``` that do the same thing with ```asyncio```, but they have their own API, so every line of ```selenium_scraper``` would need rewriting with ```await```. For a handful of tickers, threads get us the same overlap with the Selenium code we already have.
+# 
+# What about ```multiprocessing```, where every worker is a whole separate Python process? That helps when Python itself is doing the heavy lifting, but here the real work happens inside Chrome, which is its own process anyway – our threads spend nearly all their time waiting. Worker processes also can't easily use functions defined in a notebook on macOS or Windows. So threads it is. The one knob worth turning is ```MAX_WORKERS```: every worker can have its own Chrome open, so more workers means more memory, and Morningstar may start turning us away if we ask too fast.
+
 # In[11]:
 
 
-one_mo_vals
+# Let's start by adding empty Monthly and YTD columns to our df. We'll fill them in as the results come back.
+# pd.NA marks a value that's missing for now, and the "string" dtype tells pandas these columns hold text
+
+df["Monthly"] = pd.array([pd.NA] * len(df), dtype="string")
+df["YTD"] = pd.array([pd.NA] * len(df), dtype="string")
+df
+
 
+# If the scraper crashes halfway through, we don't want to lose everything it already found. So every time a ticker finishes, we write it to a CSV file straight away. When you run the cell again, it reads that file first and only scrapes the tickers that are still missing. Month End numbers change every month, so the file name includes the current month – next month's run starts a fresh file instead of reusing old numbers. (Delete the file if you want fresh numbers for everything sooner.) If a ticker fails, we print it and carry on with the rest, so just re-run the cell to try the failed ones again.
 
 # In[12]:
 
 
-ytd_vals
+# One line per ticker we've finished: Ticker, Monthly, YTD. e.g. scraped_returns_2026-10.csv
+PROGRESS_CSV = "scraped_returns_{:%Y-%m}.csv".format(date.today())
+MAX_WORKERS = 8 # How many tickers to scrape at the same time
+
+# Which rows of df belong to each ticker? Usually just one, but a ticker could be listed twice
+ticker_rows = defaultdict(list)
+for i, ticker in enumerate(df_tickers):
+    ticker_rows[ticker].append(i)
+
+result_columns = [df.columns.get_loc("Monthly"), df.columns.get_loc("YTD")]
+
+
+def fill_rows(ticker, values):
+    for i in ticker_rows[ticker]:
+        df.iloc[i, result_columns] = values
+
+
+# Pick up whatever a previous run already saved
+new_file = not os.path.exists(PROGRESS_CSV) or os.path.getsize(PROGRESS_CSV) == 0
+done = set()
+if not new_file:
+    with open(PROGRESS_CSV, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["Ticker"] in ticker_rows:
+                fill_rows(row["Ticker"], (row["Monthly"], row["YTD"]))
+                done.add(row["Ticker"])
+done
 
 
 # In[13]:
 
 
-# Now we just add these lists to our df, and we're done!
+# Now let's get the Monthly and YTD Trailing Returns for each ticker we don't have yet
+# ThreadPoolExecutor hands the tickers out to up to MAX_WORKERS threads, so several pages load at the same time
+# This could still take a minute, though, if Selenium has to step in and mimic user actions for some of them.
+# Granted, it's still a lot faster than a human going to each page and copy-pasting!
 
-df.insert(4, "Monthly", one_mo_vals)
-df.insert(5, "YTD", ytd_vals)
-df
+failed = {} # ticker -> the error it ran into
+try:
+    with open(PROGRESS_CSV, "a", newline="", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(df_tickers))) as executor:
+        writer = csv.writer(f)
+        # In "a" (append) mode we start at the end of the file, so tell() == 0 means the file is still empty
+        # Checking here, rather than reusing new_file, means re-running just this cell never adds a second header
+        if f.tell() == 0:
+            writer.writerow(["Ticker", "Monthly", "YTD"])
+
+        # ticker_rows has each ticker only once, so duplicates are only scraped once
+        futures = {executor.submit(scraper, ticker): ticker for ticker in ticker_rows if ticker not in done}
+
+        # as_completed() gives us each future as soon as it's finished, whatever order that happens in
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                one_mo, ytd = future.result() # If scraper() raised an error, result() raises it again here
+            except Exception as error:
+                # Don't let one bad ticker stop us from saving everyone else's results
+                print("Couldn't scrape " + ticker + ": " + repr(error))
+                failed[ticker] = error
+                continue
+            writer.writerow([ticker, one_mo, ytd])
+            f.flush() # Make sure it's actually in the file, not just sitting in memory
+            done.add(ticker) # So re-running this cell only retries the tickers that failed
+            fill_rows(ticker, (one_mo, ytd))
+finally:
+    close_drivers() # Every run starts new threads, so close this run's Chrome windows
+failed
 
 
 # In[14]:
 
 
+# And we're done!
+
+df
+
+
+# In[15]:
+
+
 df.to_csv('updated_stonksdata.csv', index=False, encoding='utf-8')
 
 